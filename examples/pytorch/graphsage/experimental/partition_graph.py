@@ -23,6 +23,9 @@ if __name__ == '__main__':
     argparser.add_argument('--num_trainers_per_machine', type=int, default=1,
                            help='the number of trainers per machine. The trainer ids are stored\
                                 in the node feature \'trainer_id\'')
+    argparser.add_argument('--fp16_features', action='store_true',
+                           help='store the node features in float16 to halve the bytes pulled by\
+                                the trainers. Only train_dist.py casts them back to float32.')
     argparser.add_argument('--output', type=str, default='data',
                            help='Output path of partitioned graph.')
     args = argparser.parse_args()
@@ -44,6 +47,9 @@ if __name__ == '__main__':
     else:
         balance_ntypes = None
 
+    if args.fp16_features:
+        g.ndata['features'] = g.ndata['features'].half()
+
     if args.undirected:
         sym_g = dgl.to_bidirected(g, readonly=True)
         for key in g.ndata:
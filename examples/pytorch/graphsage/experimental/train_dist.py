@@ -1,9 +1,11 @@
 import os
 os.environ['DGLBACKEND']='pytorch'
 from multiprocessing import Process
-import argparse, time, math
+import argparse, time, math, inspect
 import numpy as np
 from functools import wraps
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import tqdm
 
 import dgl
@@ -21,46 +23,137 @@ import torch.optim as optim
 import torch.multiprocessing as mp
 from torch.utils.data import DataLoader
 
-def load_subtensor(g, seeds, input_nodes, device, load_feat=True):
+def load_subtensor(g, seeds, input_nodes, device, load_feat=True, load_label=True):
     """
     Copys features and labels of a set of nodes onto GPU.
     """
     batch_inputs = g.ndata['features'][input_nodes].to(device) if load_feat else None
-    batch_labels = g.ndata['labels'][seeds].to(device)
+    batch_labels = g.ndata['labels'][seeds].to(device) if load_label else None
     return batch_inputs, batch_labels
 
 class NeighborSampler(object):
-    def __init__(self, g, fanouts, sample_neighbors, device, load_feat=True):
+    def __init__(self, g, fanouts, sample_neighbors, device, load_feat=True, load_label=True):
         self.g = g
-        self.fanouts = fanouts
+        self.fanouts = tuple(int(fanout) for fanout in fanouts)
         self.sample_neighbors = sample_neighbors
         self.device = device
         self.load_feat=load_feat
+        self.load_label=load_label
 
     def sample_blocks(self, seeds):
-        seeds = th.LongTensor(np.asarray(seeds))
-        blocks = []
-        for fanout in self.fanouts:
-            # For each seed node, sample ``fanout`` neighbors.
-            frontier = self.sample_neighbors(self.g, seeds, fanout, replace=True)
+        g, fanouts, sample_neighbors = self.g, self.fanouts, self.sample_neighbors
+        seeds = th.as_tensor(np.asarray(seeds), dtype=th.int64)
+        # Blocks are generated from the output layer to the input layer.
+        blocks = [None] * len(fanouts)
+        for i, fanout in enumerate(fanouts):
+            # For each seed node, sample ``fanout`` neighbors. Seeds in the partition on this
+            # machine are sampled in-process from the local CSR, while the requests for remote
+            # seeds are in flight, so only remote seeds go through RPC.
+            frontier = sample_neighbors(g, seeds, fanout, replace=True)
             # Then we compact the frontier into a bipartite graph for message passing.
             block = dgl.to_block(frontier, seeds)
             # Obtain the seed nodes for next layer.
             seeds = block.srcdata[dgl.NID]
 
-            blocks.insert(0, block)
+            blocks[-1 - i] = block
 
         input_nodes = blocks[0].srcdata[dgl.NID]
         seeds = blocks[-1].dstdata[dgl.NID]
-        batch_inputs, batch_labels = load_subtensor(self.g, seeds, input_nodes, "cpu", self.load_feat)
+        batch_inputs, batch_labels = load_subtensor(g, seeds, input_nodes, "cpu",
+                                                    self.load_feat, self.load_label)
         if self.load_feat:
             blocks[0].srcdata['features'] = batch_inputs
-        blocks[-1].dstdata['labels'] = batch_labels
+        if self.load_label:
+            blocks[-1].dstdata['labels'] = batch_labels
         return blocks
 
+class FeaturePrefetcher(object):
+    """
+    Wraps a DistDataLoader so that the mini-batches and their input features are fetched on a
+    background thread while the training loop computes on the current mini-batch.
+
+    Both the sampling requests and the feature pull run on a single worker thread because the
+    RPC client of DGL is not thread-safe. ``prefetch_factor`` mini-batches are kept in flight.
+
+    Features stored in float16 (see ``--fp16_features`` of partition_graph.py) are pulled and
+    transferred as is, and are cast to float32 only after being moved to ``device``.
+    On GPU, they are copied from pinned memory on a side stream so that the transfer overlaps
+    with the computation on the default stream.
+
+    The labels of the nodes in ``label_range = (start, end)`` are cached on ``device`` by the
+    training loop, so the labels are only pulled for the seeds out of the range. Each
+    mini-batch is yielded with the positions of these seeds and their labels, which are
+    combined with the cached labels by :func:`gather_labels`.
+    """
+    def __init__(self, g, dataloader, device, label_range, prefetch_factor=2):
+        self.g = g
+        self.dataloader = dataloader
+        self.device = device
+        self.prefetch_factor = max(prefetch_factor, 1)
+        self.label_range = label_range
+        self.copy_stream = th.cuda.Stream(device) if device.type == 'cuda' else None
+
+    def _fetch_next(self, it):
+        try:
+            blocks = next(it)
+        except StopIteration:
+            return None
+        batch_inputs = self.g.ndata['features'][blocks[0].srcdata[dgl.NID]]
+        seeds = blocks[-1].dstdata[dgl.NID]
+        start, end = self.label_range
+        remote_idx = th.nonzero((seeds < start) | (seeds >= end), as_tuple=True)[0]
+        remote_labels = th.zeros(0, dtype=th.int64)
+        if len(remote_idx) > 0:
+            remote_labels = self.g.ndata['labels'][seeds[remote_idx]].long()
+        tensors = [batch_inputs, remote_idx, remote_labels]
+        copy_event = None
+        if self.copy_stream is not None:
+            with th.cuda.stream(self.copy_stream):
+                tensors = [tensor.pin_memory().to(self.device, non_blocking=True)
+                           for tensor in tensors]
+                tensors[0] = tensors[0].float()
+            copy_event = th.cuda.Event()
+            copy_event.record(self.copy_stream)
+        else:
+            tensors[0] = tensors[0].float()
+        return blocks, tensors, copy_event
+
+    def __iter__(self):
+        it = iter(self.dataloader)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            futures = deque(executor.submit(self._fetch_next, it)
+                            for _ in range(self.prefetch_factor))
+            while futures:
+                batch = futures.popleft().result()
+                if batch is None:
+                    continue
+                futures.append(executor.submit(self._fetch_next, it))
+                blocks, tensors, copy_event = batch
+                if copy_event is not None:
+                    # The tensors are consumed on the current stream of the training device,
+                    # which is not necessarily the current device of this process.
+                    compute_stream = th.cuda.current_stream(self.device)
+                    copy_event.wait(compute_stream)
+                    for tensor in tensors:
+                        tensor.record_stream(compute_stream)
+                yield (blocks, *tensors)
+
+def gather_labels(seeds, local_labels, label_offset, remote_idx, remote_labels):
+    """
+    Gather the labels of ``seeds`` on their device. ``local_labels`` are the cached labels of
+    the node IDs starting from ``label_offset``. ``remote_labels`` are the labels of the seeds
+    at the positions ``remote_idx``, which are out of the cached range.
+    """
+    if len(local_labels) == 0:
+        return remote_labels
+    local_idx = (seeds - label_offset).clamp_(0, len(local_labels) - 1)
+    batch_labels = local_labels[local_idx]
+    batch_labels[remote_idx] = remote_labels
+    return batch_labels
+
 class DistSAGE(nn.Module):
     def __init__(self, in_feats, n_hidden, n_classes, n_layers,
-                 activation, dropout):
+                 activation, dropout, compile_layers=False):
         super().__init__()
         self.n_layers = n_layers
         self.n_hidden = n_hidden
@@ -70,6 +163,15 @@ class DistSAGE(nn.Module):
         for i in range(1, n_layers - 1):
             self.layers.append(dglnn.SAGEConv(n_hidden, n_hidden, 'mean'))
         self.layers.append(dglnn.SAGEConv(n_hidden, n_classes, 'mean'))
+        if compile_layers:
+            # DGL message passing cannot be traced by Dynamo and falls back to eager through
+            # a graph break, while the dense computation around it is compiled. The mean
+            # aggregation already runs as a single fused CSR SpMM kernel of DGL rather than
+            # scatter_add, so there is nothing for Inductor to fuse there. Blocks have a
+            # different number of nodes in every mini-batch, so compile with dynamic shapes.
+            th._dynamo.config.cache_size_limit = 64
+            self.layers = nn.ModuleList([th.compile(layer, dynamic=True, fullgraph=False)
+                                         for layer in self.layers])
         self.dropout = nn.Dropout(dropout)
         self.activation = activation
 
@@ -82,11 +184,13 @@ class DistSAGE(nn.Module):
                 h = self.dropout(h)
         return h
 
-    def inference(self, g, x, batch_size, device):
+    def inference(self, g, x, batch_size, device, flush_batches=4):
         """
         Inference with the GraphSAGE model on full neighbors (i.e. without neighbor sampling).
         g : the entire graph.
         x : the input of entire node set.
+        flush_batches : the number of batches whose outputs are staged before being written to
+            the distributed tensor with a single write.
 
         The inference code is written in a fashion that it could handle any number of nodes and
         layers.
@@ -98,37 +202,62 @@ class DistSAGE(nn.Module):
         # TODO: can we standardize this?
         nodes = dgl.distributed.node_split(np.arange(g.number_of_nodes()),
                                            g.get_partition_book(), force_even=True)
-        y = dgl.distributed.DistTensor((g.number_of_nodes(), self.n_hidden), th.float32, 'h',
-                                       persistent=True)
+        y_hidden = dgl.distributed.DistTensor((g.number_of_nodes(), self.n_hidden), th.float32,
+                                              'h', persistent=True)
+        y_last = dgl.distributed.DistTensor((g.number_of_nodes(), self.n_classes), th.float32,
+                                            'h_last', persistent=True)
+
+        # The sampler and the dataloader are shared by all layers. The input features are
+        # read from ``x`` below and the labels are not used, so the sampler loads neither.
+        sampler = NeighborSampler(g, [-1], dgl.distributed.sample_neighbors, device,
+                                  load_feat=False, load_label=False)
+        print('|V|={}, eval batch size: {}'.format(g.number_of_nodes(), batch_size))
+        # Create PyTorch DataLoader for constructing blocks
+        dataloader = DistDataLoader(
+            dataset=nodes,
+            batch_size=batch_size,
+            collate_fn=sampler.sample_blocks,
+            shuffle=False,
+            drop_last=False)
+
+        # The outputs are copied to a (pinned) CPU staging buffer without blocking and are
+        # written to the distributed tensor once the buffer is full.
+        flush_size = batch_size * flush_batches
+        pin_memory = device.type == 'cuda'
+        staging_ids = th.empty(flush_size, dtype=th.int64)
+
         for l, layer in enumerate(self.layers):
-            if l == len(self.layers) - 1:
-                y = dgl.distributed.DistTensor((g.number_of_nodes(), self.n_classes),
-                                               th.float32, 'h_last', persistent=True)
-
-            sampler = NeighborSampler(g, [-1], dgl.distributed.sample_neighbors, device)
-            print('|V|={}, eval batch size: {}'.format(g.number_of_nodes(), batch_size))
-            # Create PyTorch DataLoader for constructing blocks
-            dataloader = DistDataLoader(
-                dataset=nodes,
-                batch_size=batch_size,
-                collate_fn=sampler.sample_blocks,
-                shuffle=False,
-                drop_last=False)
+            y = y_last if l == len(self.layers) - 1 else y_hidden
+            staging = th.empty((flush_size, y.shape[1]), dtype=th.float32, pin_memory=pin_memory)
+            offset = 0
 
             for blocks in tqdm.tqdm(dataloader):
+                output_nodes = blocks[0].dstdata[dgl.NID]
                 block = blocks[0].to(device)
                 input_nodes = block.srcdata[dgl.NID]
-                output_nodes = block.dstdata[dgl.NID]
-                h = x[input_nodes].to(device)
+                h = x[input_nodes].to(device).float()
                 h_dst = h[:block.number_of_dst_nodes()]
                 h = layer(block, (h, h_dst))
                 if l != len(self.layers) - 1:
                     h = self.activation(h)
                     h = self.dropout(h)
 
-                y[output_nodes] = h.cpu()
-
+                if offset + len(output_nodes) > flush_size:
+                    if pin_memory:
+                        th.cuda.current_stream(device).synchronize()
+                    y[staging_ids[:offset]] = staging[:offset]
+                    offset = 0
+                staging[offset:offset + len(output_nodes)].copy_(h, non_blocking=True)
+                staging_ids[offset:offset + len(output_nodes)] = output_nodes
+                offset += len(output_nodes)
+
+            if offset > 0:
+                if pin_memory:
+                    th.cuda.current_stream(device).synchronize()
+                y[staging_ids[:offset]] = staging[:offset]
             x = y
+            # The next layer (and the caller for the last layer) reads rows written by other
+            # trainers, and DistTensor writes are asynchronous, so this barrier is required.
             g.barrier()
         return y
 
@@ -148,12 +277,35 @@ def evaluate(model, g, inputs, labels, val_nid, test_nid, batch_size, device):
     val_nid : the node Ids for validation.
     batch_size : Number of nodes to compute at the same time.
     device : The GPU device to evaluate on.
+
+    ``val_nid`` and ``test_nid`` are the split of this trainer. The returned accuracies are
+    computed over the splits of all trainers.
     """
     model.eval()
     with th.no_grad():
         pred = model.inference(g, inputs, batch_size, device)
     model.train()
-    return compute_acc(pred[val_nid], labels[val_nid]), compute_acc(pred[test_nid], labels[test_nid])
+    # Sum up the correct predictions of all trainers with a single allreduce.
+    val_correct = (th.argmax(pred[val_nid], dim=1) == labels[val_nid].long()).sum()
+    test_correct = (th.argmax(pred[test_nid], dim=1) == labels[test_nid].long()).sum()
+    counts = th.tensor([val_correct, len(val_nid), test_correct, len(test_nid)], dtype=th.int64)
+    if th.distributed.is_initialized():
+        th.distributed.all_reduce(counts, th.distributed.ReduceOp.SUM)
+    counts = counts.tolist()
+    # A split can be empty on all trainers (e.g., a dataset without a test set).
+    return counts[0] / max(counts[1], 1), counts[2] / max(counts[3], 1)
+
+def get_allreduce_hook(grad_compress):
+    """
+    Return the DDP communication hook that compresses the gradient buckets to the precision
+    ``grad_compress`` for allreduce.
+    """
+    # The DDP communication hooks are only available since PyTorch 1.8.
+    from torch.distributed.algorithms.ddp_comm_hooks import default_hooks
+    if grad_compress == 'fp16':
+        return default_hooks.fp16_compress_hook
+    else:
+        return default_hooks.bf16_compress_hook
 
 def pad_data(nids):
     """
@@ -170,9 +322,8 @@ def pad_data(nids):
     max_num_nodes = int(num_nodes)
     nids_length = nids.shape[0]
     if max_num_nodes > nids_length:
-        pad_size = max_num_nodes % nids_length
-        repeat_size = max_num_nodes // nids_length
-        new_nids = th.cat([nids for _ in range(repeat_size)] + [nids[:pad_size]], axis=0)
+        repeat_size = (max_num_nodes + nids_length - 1) // nids_length
+        new_nids = nids.repeat(repeat_size)[:max_num_nodes]
         print("Pad nids from {} to {}".format(nids_length, max_num_nodes))
     else:
         new_nids = nids
@@ -182,11 +333,15 @@ def pad_data(nids):
 
 def run(args, device, data):
     # Unpack data
-    train_nid, val_nid, test_nid, in_feats, n_classes, g = data
+    train_nid, val_nid, test_nid, in_feats, n_classes, g, label_offset, local_labels = data
     train_nid = pad_data(train_nid)
     # Create sampler
-    sampler = NeighborSampler(g, [int(fanout) for fanout in args.fan_out.split(',')],
-                              dgl.distributed.sample_neighbors, device)
+    # Input features are pulled by the prefetcher so that the pull overlaps with computation.
+    # The labels of the local partition are cached on the device, so the prefetcher only pulls
+    # the labels of the remote seeds.
+    sampler = NeighborSampler(g, args.fan_out.split(','),
+                              dgl.distributed.sample_neighbors, device, load_feat=False,
+                              load_label=False)
 
     # Create DataLoader for constructing blocks
     dataloader = DistDataLoader(
@@ -195,24 +350,51 @@ def run(args, device, data):
         collate_fn=sampler.sample_blocks,
         shuffle=True,
         drop_last=False)
+    label_range = (label_offset, label_offset + len(local_labels))
+    dataloader = FeaturePrefetcher(g, dataloader, device, label_range, args.prefetch_factor)
 
     # Define model and optimizer
-    model = DistSAGE(in_feats, args.num_hidden, n_classes, args.num_layers, F.relu, args.dropout)
+    model = DistSAGE(in_feats, args.num_hidden, n_classes, args.num_layers, F.relu, args.dropout,
+                     compile_layers=args.compile)
     model = model.to(device)
+    nccl_group = None
     if not args.standalone:
+        # Gradients are written directly into the allreduce buckets and the bucket layout is
+        # fixed after the first iteration, so that allreduce overlaps with backward.
+        ddp_kwargs = dict(bucket_cap_mb=args.bucket_cap_mb, gradient_as_bucket_view=True,
+                          find_unused_parameters=False)
+        # `static_graph` is an argument of DDP since PyTorch 1.11.
+        ddp_params = inspect.signature(th.nn.parallel.DistributedDataParallel.__init__).parameters
+        if 'static_graph' in ddp_params:
+            ddp_kwargs['static_graph'] = True
         if args.num_gpus == -1:
-            model = th.nn.parallel.DistributedDataParallel(model)
+            model = th.nn.parallel.DistributedDataParallel(model, **ddp_kwargs)
         else:
+            # The default process group uses gloo for the collectives on CPU tensors (e.g.,
+            # padding and statistics). The gradients on GPU are allreduced with NCCL instead of
+            # being staged through host memory by gloo.
+            nccl_group = th.distributed.new_group(backend='nccl')
             dev_id = g.rank() % args.num_gpus
-            model = th.nn.parallel.DistributedDataParallel(model, device_ids=[dev_id], output_device=dev_id)
+            model = th.nn.parallel.DistributedDataParallel(model, device_ids=[dev_id],
+                                                           output_device=dev_id,
+                                                           process_group=nccl_group, **ddp_kwargs)
+        # PyTorch 1.9 and 1.10 only have the private equivalent of `static_graph`, and older
+        # versions build the buckets dynamically.
+        if 'static_graph' not in ddp_params and hasattr(model, '_set_static_graph'):
+            model._set_static_graph()
+    if not args.standalone:
+        if args.grad_compress != 'none':
+            # The state of the hook is the process group to allreduce in (None for the default
+            # process group).
+            model.register_comm_hook(nccl_group, get_allreduce_hook(args.grad_compress))
     loss_fcn = nn.CrossEntropyLoss()
     loss_fcn = loss_fcn.to(device)
     optimizer = optim.Adam(model.parameters(), lr=args.lr)
 
-    train_size = th.sum(g.ndata['train_mask'][0:g.number_of_nodes()])
-
     # Training loop
-    iter_tput = []
+    # The running throughput skips the first 3 steps of the run, which include warm-up.
+    tput_sum = 0.0
+    tput_n = 0
     epoch = 0
     for epoch in range(args.num_epochs):
         tic = time.time()
@@ -226,48 +408,57 @@ def run(args, device, data):
         start = time.time()
         # Loop over the dataloader to sample the computation dependency graph as a list of
         # blocks.
-        step_time = []
-        for step, blocks in enumerate(dataloader):
+        step_time = deque(maxlen=args.log_every)
+        for step, (blocks, batch_inputs, remote_idx, remote_labels) in enumerate(dataloader):
             tic_step = time.time()
             sample_time += tic_step - start
 
             # The nodes for input lies at the LHS side of the first block.
             # The nodes for output lies at the RHS side of the last block.
-            batch_inputs = blocks[0].srcdata['features']
-            batch_labels = blocks[-1].dstdata['labels']
-            batch_labels = batch_labels.long()
-
             num_seeds += len(blocks[-1].dstdata[dgl.NID])
             num_inputs += len(blocks[0].srcdata[dgl.NID])
-            blocks = [block.to(device) for block in blocks]
-            batch_labels = batch_labels.to(device)
+            blocks = [block.to(device, non_blocking=True) for block in blocks]
+            batch_labels = gather_labels(blocks[-1].dstdata[dgl.NID], local_labels, label_offset,
+                                         remote_idx, remote_labels)
             # Compute loss and prediction
             start = time.time()
             batch_pred = model(blocks, batch_inputs)
             loss = loss_fcn(batch_pred, batch_labels)
             forward_end = time.time()
-            optimizer.zero_grad()
             loss.backward()
             compute_end = time.time()
             forward_time += forward_end - start
             backward_time += compute_end - forward_end
 
             optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
             update_time += time.time() - compute_end
 
             step_t = time.time() - tic_step
             step_time.append(step_t)
-            iter_tput.append(len(blocks[-1].dstdata[dgl.NID]) / step_t)
+            if tput_n >= 3:
+                tput_sum += len(blocks[-1].dstdata[dgl.NID]) / step_t
+            tput_n += 1
             if step % args.log_every == 0:
                 acc = compute_acc(batch_pred, batch_labels)
                 gpu_mem_alloc = th.cuda.max_memory_allocated() / 1000000 if th.cuda.is_available() else 0
                 print('Part {} | Epoch {:05d} | Step {:05d} | Loss {:.4f} | Train Acc {:.4f} | Speed (samples/sec) {:.4f} | GPU {:.1f} MB | time {:.3f} s'.format(
-                    g.rank(), epoch, step, loss.item(), acc.item(), np.mean(iter_tput[3:]), gpu_mem_alloc, np.sum(step_time[-args.log_every:])))
+                    g.rank(), epoch, step, loss.item(), acc.item(), tput_sum / max(1, tput_n - 3), gpu_mem_alloc, sum(step_time)))
             start = time.time()
 
         toc = time.time()
-        print('Part {}, Epoch Time(s): {:.4f}, sample+data_copy: {:.4f}, forward: {:.4f}, backward: {:.4f}, update: {:.4f}, #seeds: {}, #inputs: {}'.format(
-            g.rank(), toc - tic, sample_time, forward_time, backward_time, update_time, num_seeds, num_inputs))
+        # Aggregate the epoch statistics of all trainers with a single allreduce: the times are
+        # averaged and the numbers of nodes are summed.
+        stats = th.tensor([toc - tic, sample_time, forward_time, backward_time, update_time,
+                           num_seeds, num_inputs], dtype=th.float64)
+        num_trainers = 1
+        if not args.standalone:
+            th.distributed.all_reduce(stats, th.distributed.ReduceOp.SUM)
+            num_trainers = th.distributed.get_world_size()
+        stats[:5] /= num_trainers
+        if g.rank() == 0:
+            print('Epoch {:05d}, Epoch Time(s): {:.4f}, sample+data_copy: {:.4f}, forward: {:.4f}, backward: {:.4f}, update: {:.4f}, #seeds: {}, #inputs: {}'.format(
+                epoch, *stats[:5].tolist(), int(stats[5]), int(stats[6])))
         epoch += 1
 
 
@@ -275,8 +466,9 @@ def run(args, device, data):
             start = time.time()
             val_acc, test_acc = evaluate(model.module, g, g.ndata['features'],
                                          g.ndata['labels'], val_nid, test_nid, args.batch_size_eval, device)
-            print('Part {}, Val Acc {:.4f}, Test Acc {:.4f}, time: {:.4f}'.format(g.rank(), val_acc, test_acc,
-                                                                                  time.time() - start))
+            if g.rank() == 0:
+                print('Val Acc {:.4f}, Test Acc {:.4f}, time: {:.4f}'.format(val_acc, test_acc,
+                                                                             time.time() - start))
 
 def main(args):
     dgl.distributed.initialize(args.ip_config)
@@ -297,22 +489,44 @@ def main(args):
         train_nid = dgl.distributed.node_split(g.ndata['train_mask'], pb, force_even=True)
         val_nid = dgl.distributed.node_split(g.ndata['val_mask'], pb, force_even=True)
         test_nid = dgl.distributed.node_split(g.ndata['test_mask'], pb, force_even=True)
-    local_nid = pb.partid2nids(pb.partid).detach().numpy()
+    local_nid = np.sort(pb.partid2nids(pb.partid).detach().numpy())
+    def num_local(nids):
+        # ``local_nid`` is sorted and unique, so a binary search counts the local nodes
+        # without sorting ``nids``.
+        nids = nids.numpy()
+        return int((np.searchsorted(local_nid, nids, side='right')
+                    - np.searchsorted(local_nid, nids, side='left')).sum())
     print('part {}, train: {} (local: {}), val: {} (local: {}), test: {} (local: {})'.format(
-        g.rank(), len(train_nid), len(np.intersect1d(train_nid.numpy(), local_nid)),
-        len(val_nid), len(np.intersect1d(val_nid.numpy(), local_nid)),
-        len(test_nid), len(np.intersect1d(test_nid.numpy(), local_nid))))
+        g.rank(), len(train_nid), num_local(train_nid), len(val_nid), num_local(val_nid),
+        len(test_nid), num_local(test_nid)))
     if args.num_gpus == -1:
         device = th.device('cpu')
     else:
         device = th.device('cuda:'+str(args.local_rank))
-    labels = g.ndata['labels'][np.arange(g.number_of_nodes())]
-    n_classes = len(th.unique(labels[th.logical_not(th.isnan(labels))]))
+    labels = g.ndata['labels'][local_nid]
+    if args.n_classes:
+        n_classes = args.n_classes
+    else:
+        # Only use the labels of the local partition and merge the classes seen by all trainers.
+        classes = th.unique(labels[th.logical_not(th.isnan(labels))])
+        if not args.standalone:
+            all_classes = [None] * th.distributed.get_world_size()
+            th.distributed.all_gather_object(all_classes, classes)
+            classes = th.unique(th.cat(all_classes))
+        n_classes = len(classes)
     print('#labels:', n_classes)
 
+    # Cache the labels of the local partition on the training device. After reshuffling, a
+    # partition owns a contiguous range of node IDs, so the labels are looked up by offset.
+    # Otherwise, nothing is cached and the labels of all seeds are pulled.
+    if len(local_nid) > 0 and int(local_nid[-1]) - int(local_nid[0]) + 1 == len(local_nid):
+        label_offset, local_labels = int(local_nid[0]), labels.long().to(device)
+    else:
+        label_offset, local_labels = 0, th.zeros(0, dtype=th.int64, device=device)
+
     # Pack data
     in_feats = g.ndata['features'].shape[1]
-    data = train_nid, val_nid, test_nid, in_feats, n_classes, g
+    data = train_nid, val_nid, test_nid, in_feats, n_classes, g, label_offset, local_labels
     run(args, device, data)
     print("parent ends")
 
@@ -324,7 +538,8 @@ if __name__ == '__main__':
     parser.add_argument('--ip_config', type=str, help='The file for IP configuration')
     parser.add_argument('--part_config', type=str, help='The path to the partition config file')
     parser.add_argument('--num_clients', type=int, help='The number of clients')
-    parser.add_argument('--n_classes', type=int, help='the number of classes')
+    parser.add_argument('--n_classes', type=int,
+                        help='the number of classes. It is computed from the labels if not given')
     parser.add_argument('--num_gpus', type=int, default=-1,
                         help="the number of GPU device. Use -1 for CPU training")
     parser.add_argument('--num_epochs', type=int, default=20)
@@ -333,10 +548,21 @@ if __name__ == '__main__':
     parser.add_argument('--fan_out', type=str, default='10,25')
     parser.add_argument('--batch_size', type=int, default=1000)
     parser.add_argument('--batch_size_eval', type=int, default=100000)
+    parser.add_argument('--prefetch_factor', type=int, default=2,
+                        help="the number of mini-batches whose features are fetched ahead")
     parser.add_argument('--log_every', type=int, default=20)
     parser.add_argument('--eval_every', type=int, default=5)
     parser.add_argument('--lr', type=float, default=0.003)
     parser.add_argument('--dropout', type=float, default=0.5)
+    parser.add_argument('--bucket_cap_mb', type=int, default=128,
+                        help="the bucket size of DDP gradient allreduce in MB. The default is "
+                             "large enough to fuse all the gradients of the model into one bucket")
+    parser.add_argument('--grad_compress', type=str, default='none',
+                        choices=['none', 'fp16', 'bf16'],
+                        help="compress the gradients to the given precision for allreduce. "
+                             "bf16 requires NCCL 2.10+ for GPU training")
+    parser.add_argument('--compile', action='store_true',
+                        help="compile the SAGEConv layers with torch.compile (PyTorch 2.0+)")
     parser.add_argument('--local_rank', type=int, help='get rank of the process')
     parser.add_argument('--standalone', action='store_true', help='run in the standalone mode')
     args = parser.parse_args()
@@ -7,7 +7,7 @@ from ..object_generic import convert_to_object, ObjectGeneric
 from ..runtime_ctypes import DGLType, DGLContext, DGLByteArray
 
 
-cdef void dgl_callback_finalize(void* fhandle):
+cdef void dgl_callback_finalize(void* fhandle) with gil:
     local_pyfunc = <object>(fhandle)
     Py_DECREF(local_pyfunc)
 
@@ -204,12 +204,18 @@ cdef inline int FuncCall3(void* chandle,
                           int* ret_tcode) except -1:
     cdef DGLValue[3] values
     cdef int[3] tcodes
+    cdef int c_api_ret_code
     nargs = len(args)
     temp_args = []
     for i in range(nargs):
         make_arg(args[i], &values[i], &tcodes[i], temp_args)
-    CALL(DGLFuncCall(chandle, &values[0], &tcodes[0],
-                     nargs, ret_val, ret_tcode))
+    # Release the GIL like the ctypes FFI does, so that other Python threads can run
+    # while a blocking C API call (e.g., waiting for an RPC response) is in progress.
+    # Callbacks into Python re-acquire the GIL in dgl_callback.
+    with nogil:
+        c_api_ret_code = DGLFuncCall(chandle, &values[0], &tcodes[0],
+                                     nargs, ret_val, ret_tcode)
+    CALL(c_api_ret_code)
     return 0
 
 cdef inline int FuncCall(void* chandle,
@@ -224,13 +230,16 @@ cdef inline int FuncCall(void* chandle,
 
     cdef vector[DGLValue] values
     cdef vector[int] tcodes
+    cdef int c_api_ret_code
     values.resize(max(nargs, 1))
     tcodes.resize(max(nargs, 1))
     temp_args = []
     for i in range(nargs):
         make_arg(args[i], &values[i], &tcodes[i], temp_args)
-    CALL(DGLFuncCall(chandle, &values[0], &tcodes[0],
-                     nargs, ret_val, ret_tcode))
+    with nogil:
+        c_api_ret_code = DGLFuncCall(chandle, &values[0], &tcodes[0],
+                                     nargs, ret_val, ret_tcode)
+    CALL(c_api_ret_code)
     return 0
 
 
@@ -238,6 +238,11 @@ def check_dist_graph(g, num_clients, num_nodes, num_edges):
     feats = F.squeeze(feats1, 1)
     assert np.all(F.asnumpy(feats == nids))
 
+    # Test reading node data stored in float16
+    feats = F.squeeze(g.ndata['features_fp16'][nids], 1)
+    assert F.dtype(feats) == F.float16
+    assert np.all(F.asnumpy(feats) == F.asnumpy(nids) % 1024)
+
     # Test reading edge data
     eids = F.arange(0, int(g.number_of_edges() / 2))
     feats1 = g.edata['features'][eids]
@@ -353,6 +358,7 @@ def check_server_client(shared_mem, num_servers, num_clients):
     num_parts = 1
     graph_name = 'dist_graph_test_2'
     g.ndata['features'] = F.unsqueeze(F.arange(0, g.number_of_nodes()), 1)
+    g.ndata['features_fp16'] = F.astype(g.ndata['features'] % 1024, F.float16)
     g.edata['features'] = F.unsqueeze(F.arange(0, g.number_of_edges()), 1)
     partition_graph(g, graph_name, num_parts, '/tmp/dist_graph')
 
@@ -615,6 +621,7 @@ def test_standalone():
     num_parts = 1
     graph_name = 'dist_graph_test_3'
     g.ndata['features'] = F.unsqueeze(F.arange(0, g.number_of_nodes()), 1)
+    g.ndata['features_fp16'] = F.astype(g.ndata['features'] % 1024, F.float16)
     g.edata['features'] = F.unsqueeze(F.arange(0, g.number_of_edges()), 1)
     partition_graph(g, graph_name, num_parts, '/tmp/dist_graph')
 